@@ -4,77 +4,438 @@
 vpcctl - A tool to build and manage Virtual Private Clouds (VPCs) on Linux hosts.
 """
 
-import argparse
-import subprocess
 import sys
-import logging
 import os
-import ipaddress
-import re
+
+
+# Daemon Client
+# Defined ahead of the other imports: a command sent to a daemon (see
+# "Daemon Mode" below) only needs socket and json.
+def run_via_daemon(socket_path, argv):
+    """Sends a command to a running daemon and relays its output and exit code."""
+    import json
+    import socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            with client.makefile("rwb") as sock_file:
+                sock_file.write(json.dumps({"argv": argv}).encode() + b"\n")
+                sock_file.flush()
+                for line in sock_file:
+                    message = json.loads(line)
+                    if "exit" in message:
+                        sys.exit(message["exit"])
+                    out = sys.stdout if message["stream"] == "stdout" else sys.stderr
+                    out.write(message["data"])
+                    out.flush()
+    except OSError as e:
+        sys.stderr.write(f"Could not reach vpcctl daemon at {socket_path}: {e}\n")
+        sys.exit(1)
+    sys.stderr.write("vpcctl daemon closed the connection without an exit status.\n")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    # Bail out before the heavier imports below when not running as root
+    if os.geteuid() != 0:
+        sys.stderr.write("This script must be run as root (or with sudo).\n")
+        sys.exit(1)
+    if os.environ.get("VPCCTL_SOCKET") and "daemon" not in sys.argv[1:3]:
+        run_via_daemon(os.environ["VPCCTL_SOCKET"], sys.argv[1:])
+
+import subprocess
+import logging
 import json
-import hashlib
+import types
+import shutil
+import socket
+import struct
+import contextlib
+import threading
+from functools import lru_cache
 
 # Set up logging to print clearly
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
+class CachedTimeFormatter(logging.Formatter):
+    """
+    Formatter that renders the timestamp once per second and reuses it.
+    The date format has one-second resolution, so the output is unchanged.
+    """
+    _cache = (None, "")
+
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        cached_second, cached_text = self._cache
+        if second != cached_second:
+            cached_text = super().formatTime(record, datefmt)
+            self._cache = (second, cached_text)
+        return cached_text
+
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(CachedTimeFormatter(
+    "%(asctime)s [%(levelname)s] %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
-)
+))
+logging.basicConfig(level=logging.INFO, handlers=[log_handler])
 log = logging.getLogger(__name__)
 
 
 # Core Utility Function
-def run_cmd(cmd_list, check=True, capture=True):
+@lru_cache(maxsize=None)
+def resolve_binary(name):
+    """
+    Resolves a command name to its absolute path (None if not on PATH).
+    Each name is looked up once per run; subprocess only uses the
+    posix_spawn() fast path for absolute paths.
+    """
+    return shutil.which(name)
+
+CLONE_NEWNET = 0x40000000
+
+@lru_cache(maxsize=None)
+def _libc():
+    # ctypes is only needed for namespaced commands
+    import ctypes
+    return ctypes.CDLL(None, use_errno=True), ctypes.get_errno
+
+def _run_in_netns(netns, **kwargs):
+    """
+    Runs subprocess.run(**kwargs) inside a named network namespace.
+    A child starts in the namespace of the thread that spawns it, so the
+    spawn happens on a short-lived thread that has joined the namespace
+    with setns(2). No preexec_fn is needed (it is unsafe once other threads
+    exist), and the thread is never reused, so the rest of the process
+    stays where it was.
+    """
+    libc, get_errno = _libc()
+    outcome = {}
+
+    def spawn():
+        try:
+            fd = os.open(os.path.join(NETNS_RUN_DIR, netns), os.O_RDONLY)
+            try:
+                if libc.setns(fd, CLONE_NEWNET) != 0:
+                    errno = get_errno()
+                    raise OSError(errno, f"setns into {netns}: {os.strerror(errno)}")
+            finally:
+                os.close(fd)
+            outcome["process"] = subprocess.run(**kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=spawn, name=f"netns-{netns}")
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["process"]
+
+def run_cmd(cmd_list, check=True, capture=False, input_text=None, netns=None, quiet_success=False):
     """
     Runs a shell command, logs it, and handles errors.
+    stdout is only collected when capture=True; otherwise it is discarded.
+    stderr is always collected so failures stay diagnosable. With
+    quiet_success=True it is not logged when the command succeeds (for
+    tools that report success on stderr).
+    If input_text is given, it is written to the command's stdin.
+    If netns is given, the command runs inside that network namespace.
     """
-    cmd_str = " ".join(cmd_list)
-    log.info(f"Running: {cmd_str}")
+    if log.isEnabledFor(logging.INFO):
+        if netns:
+            log.info("Running in %s: %s", netns, " ".join(cmd_list))
+        else:
+            log.info("Running: %s", " ".join(cmd_list))
+    executable = resolve_binary(cmd_list[0])
+    if executable is None:
+        log.error("Command not found: %s. Please ensure it is installed.", cmd_list[0])
+        sys.exit(1)
     try:
-        process = subprocess.Popen(
-            cmd_list,
-            stdout=subprocess.PIPE if capture else None,
-            stderr=subprocess.PIPE if capture else None,
+        # An absolute executable and close_fds=False let CPython launch the
+        # child with posix_spawn() instead of fork()+exec(). Python's own
+        # descriptors are non-inheritable, so nothing leaks into the child.
+        # Namespaced commands are spawned from a thread inside the namespace
+        # instead of going through `ip netns exec`, which costs an extra
+        # exec and a remount.
+        run_args = dict(
+            args=cmd_list,
+            executable=executable,
+            close_fds=False,
+            input=input_text,
+            stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
             text=True
         )
-        stdout, stderr = process.communicate()
+        if netns:
+            process = _run_in_netns(netns, **run_args)
+        else:
+            process = subprocess.run(**run_args)
+        stdout = process.stdout or ""
+        stderr = process.stderr or ""
         
         if check and process.returncode != 0:
-            log.error(f"Failed to run: {cmd_str}")
-            log.error(f"Return Code: {process.returncode}")
-            if stdout: log.error(f"STDOUT: {stdout.strip()}")
-            if stderr: log.error(f"STDERR: {stderr.strip()}")
+            log.error("Failed to run: %s", " ".join(cmd_list))
+            log.error("Return Code: %s", process.returncode)
+            if stdout: log.error("STDOUT: %s", stdout.strip())
+            if stderr: log.error("STDERR: %s", stderr.strip())
             sys.exit(1)
         
-        if stdout:
-            log.debug(f"STDOUT: {stdout.strip()}")
-        if stderr and process.returncode == 0:
-            log.warning(f"STDERR: {stderr.strip()}")
+        if stdout and log.isEnabledFor(logging.DEBUG):
+            log.debug("STDOUT: %s", stdout.strip())
+        if stderr and process.returncode == 0 and not quiet_success:
+            log.warning("STDERR: %s", stderr.strip())
         elif stderr and process.returncode != 0:
-            log.error(f"STDERR: {stderr.strip()}")
+            log.error("STDERR: %s", stderr.strip())
         return stdout, stderr
 
-    except FileNotFoundError as e:
-        log.error(f"Command not found: {cmd_list[0]}. Please ensure it is installed.")
-        log.error(f"Error: {e}")
-        sys.exit(1)
     except Exception as e:
-        log.error(f"An unexpected error occurred with: {cmd_str}")
-        log.error(f"Error: {e}")
+        log.error("An unexpected error occurred with: %s", " ".join(cmd_list))
+        log.error("Error: %s", e)
         sys.exit(1)
 
 
+def apply_iptables_batch(rules, netns=None, test=False):
+    """
+    Applies a batch of iptables rules in one atomic iptables-restore commit.
+    `rules` maps a table name (e.g. 'filter', 'nat') to a list of rule lines
+    (e.g. '-A FORWARD -i br-foo -j DROP'). Rules are applied in list order.
+    If `netns` is given, the batch is applied inside that network namespace.
+    With test=True the batch is only parsed and checked (--test), not committed.
+    """
+    lines = []
+    for table, table_rules in rules.items():
+        if not table_rules:
+            continue
+        lines.append(f"*{table}")
+        lines.extend(table_rules)
+        lines.append("COMMIT")
+    if not lines:
+        return
+    if not test and log.isEnabledFor(logging.INFO):
+        for line in lines:
+            log.info("   iptables-restore: %s", line)
+    # --wait takes the xtables lock once for the whole batch, waiting up to
+    # 5s for a concurrent iptables user instead of failing immediately.
+    cmd = ["iptables-restore", "--wait", "5", "--noflush"]
+    if test:
+        cmd.append("--test")
+    run_cmd(cmd, input_text="\n".join(lines) + "\n", netns=netns)
+
+
+def apply_ipset_batch(lines, netns=None):
+    """
+    Applies a list of ipset commands (e.g. 'add myset 80') with a single
+    `ipset -exist restore`, optionally inside a network namespace.
+    """
+    if not lines:
+        return
+    if log.isEnabledFor(logging.INFO):
+        for line in lines:
+            log.info("   ipset restore: %s", line)
+    run_cmd(["ipset", "-exist", "restore"], input_text="\n".join(lines) + "\n", netns=netns)
+
+def run_ip_batch(cmds, netns=None, check=True):
+    """
+    Runs several `ip` commands in a single `ip -batch -` process.
+    Each entry in `cmds` is an argument list without the leading 'ip'
+    (e.g. ['link', 'set', 'dev', 'lo', 'up']). If `netns` is given, the
+    whole batch runs inside that network namespace. With check=False the
+    batch is best-effort: `-force` keeps going past failing commands.
+    """
+    if not cmds:
+        return
+    batch_cmd = ["ip"]
+    if netns:
+        batch_cmd += ["-n", netns]
+    if not check:
+        batch_cmd.append("-force")
+    batch_cmd += ["-batch", "-"]
+    lines = [" ".join(cmd) for cmd in cmds]
+    if log.isEnabledFor(logging.INFO):
+        for line in lines:
+            log.info("   ip batch: %s", line)
+    run_cmd(batch_cmd, input_text="\n".join(lines) + "\n", check=check)
+
+
+class IpBatch:
+    """
+    Collects `ip` commands and runs them in one `ip -batch -` process when
+    the `with` block exits cleanly; nothing is run if the block raises.
+
+        with IpBatch(netns="ns-foo") as batch:
+            batch.add("link", "set", "dev", "lo", "up")
+    """
+    def __init__(self, netns=None, check=True):
+        self.netns = netns
+        self.check = check
+        self.cmds = []
+
+    def add(self, *args):
+        self.cmds.append(list(args))
+
+    def commit(self):
+        cmds, self.cmds = self.cmds, []
+        run_ip_batch(cmds, self.netns, self.check)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+
+# sysctl values already confirmed in this process (key -> value)
+_sysctl_applied = {}
+
+def sysctl_set(key, value):
+    """
+    Sets a sysctl (e.g. 'net.ipv4.ip_forward') by writing /proc/sys directly.
+    As with sysctl(8), a key containing '/' is used as a path as-is, which
+    keeps interface names with dots intact ('net/ipv4/conf/br-a.1/forwarding').
+    The value is only written if it differs from the current one, and a
+    key already set by this process is not read again.
+    """
+    if _sysctl_applied.get(key) == value:
+        return
+    path = f"/proc/sys/{key if '/' in key else key.replace('.', '/')}"
+    try:
+        # Raw fd I/O: one read() and one pwrite() syscall, no buffered file
+        # object. /proc/sys entries take the whole value in a single write.
+        fd = os.open(path, os.O_RDWR)
+        try:
+            current = os.read(fd, 64).decode().strip()
+            if current == value:
+                log.info(f"   sysctl {key} already {value}")
+            else:
+                log.info(f"   Setting sysctl {key}={value}")
+                os.pwrite(fd, value.encode(), 0)
+        finally:
+            os.close(fd)
+    except OSError as e:
+        log.error(f"Failed to set sysctl {key}={value}: {e}")
+        sys.exit(1)
+    _sysctl_applied[key] = value
+
+
+# Kernel State Lookups
+# iproute2 bind-mounts named network namespaces here
+NETNS_RUN_DIR = "/var/run/netns"
+
+def module_loaded(module):
+    return os.path.isdir(f"/sys/module/{module}")
+
+def load_kernel_module(module):
+    """
+    Loads a kernel module, skipping the modprobe fork if it is already loaded.
+    """
+    if module_loaded(module):
+        return
+    run_cmd(["modprobe", module], check=False)
+
+def link_exists(ifname):
+    return os.path.exists(f"/sys/class/net/{ifname}")
+
+def bridge_exists(ifname):
+    return os.path.isdir(f"/sys/class/net/{ifname}/bridge")
+
+# rtnetlink constants (linux/netlink.h, linux/rtnetlink.h, linux/if_addr.h)
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_GETADDR = 22
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+NLMSG_HDR = struct.Struct("=IHHII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR_HDR = struct.Struct("=HH")
+
+def _nl_align(length):
+    return (length + 3) & ~3
+
+def iface_ipv4_addrs(ifname):
+    """
+    Returns the IPv4 addresses configured on an interface, asked from the
+    kernel over an rtnetlink RTM_GETADDR dump instead of running `ip addr show`.
+    """
+    index = socket.if_nametoindex(ifname)
+    addrs = set()
+    with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+        request = IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)
+        sock.send(NLMSG_HDR.pack(NLMSG_HDR.size + len(request), RTM_GETADDR,
+                                 NLM_F_REQUEST | NLM_F_DUMP, 1, 0) + request)
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + NLMSG_HDR.size <= len(data):
+                msg_len, msg_type, _, _, _ = NLMSG_HDR.unpack_from(data, offset)
+                if msg_type == NLMSG_DONE:
+                    return addrs
+                if msg_type == NLMSG_ERROR:
+                    errno = -struct.unpack_from("=i", data, offset + NLMSG_HDR.size)[0]
+                    raise OSError(errno, os.strerror(errno))
+                if msg_type == RTM_NEWADDR:
+                    _, _, _, _, ifa_index = IFADDRMSG.unpack_from(data, offset + NLMSG_HDR.size)
+                    attr = offset + NLMSG_HDR.size + IFADDRMSG.size
+                    while ifa_index == index and attr + RTATTR_HDR.size <= offset + msg_len:
+                        attr_len, attr_type = RTATTR_HDR.unpack_from(data, attr)
+                        if attr_len < RTATTR_HDR.size:
+                            break
+                        if attr_type in (IFA_ADDRESS, IFA_LOCAL):
+                            start = attr + RTATTR_HDR.size
+                            addrs.add(socket.inet_ntop(socket.AF_INET, data[start:start + 4]))
+                        attr += _nl_align(attr_len)
+                offset += _nl_align(msg_len)
+
+def iface_has_addr(ifname, ip):
+    return ip in iface_ipv4_addrs(ifname)
+
+# Named namespaces, read from NETNS_RUN_DIR on first use (None = not read yet)
+_netns_cache = None
+
+def _list_netns():
+    """
+    Returns the set of named network namespaces without forking `ip netns list`.
+    """
+    global _netns_cache
+    if _netns_cache is None:
+        try:
+            _netns_cache = set(os.listdir(NETNS_RUN_DIR))
+        except FileNotFoundError:
+            _netns_cache = set()
+    return _netns_cache
+
+def invalidate_netns_cache():
+    """Must be called after any `ip netns add` / `ip netns delete`."""
+    global _netns_cache
+    _netns_cache = None
+
+def netns_exists(ns_name):
+    # A single stat is cheaper than listing the directory for one lookup
+    if _netns_cache is None:
+        return os.path.exists(os.path.join(NETNS_RUN_DIR, ns_name))
+    return ns_name in _netns_cache
+
+def delete_netns(ns_name):
+    run_cmd(["ip", "netns", "delete", ns_name], check=False)
+    invalidate_netns_cache()
+
+
 # Naming and Resource Function
+@lru_cache(maxsize=256)
 def get_bridge_name(vpc_name):
     return f"br-{vpc_name}"
 
+@lru_cache(maxsize=256)
 def get_namespace_name(vpc_name, subnet_name):
     return f"ns-{vpc_name}-{subnet_name}"
 
+@lru_cache(maxsize=256)
 def get_veth_pair_names(vpc_name, subnet_name):
     """
     Gets a unique (and short) names for the veth pair
     """
+    import hashlib
     unique_str = f"{vpc_name}-{subnet_name}"
     hash_id = hashlib.md5(unique_str.encode()).hexdigest()[:3] # e.g. 'a1b'
     v_abbr = vpc_name[:2]   # e.g. "vpc-demo" -> "vp"
@@ -84,29 +445,103 @@ def get_veth_pair_names(vpc_name, subnet_name):
     br_side = f"veth-{unique_id}-br"  # e.g. veth-vppua1b-br
     return (ns_side, br_side)
 
+@lru_cache(maxsize=256)
+def get_vpc_chain_name(vpc_name):
+    """
+    Gets the name of the VPC's own iptables filter chain
+    """
+    return f"VPCCTL-{vpc_name}"
+
+@lru_cache(maxsize=256)
+def get_public_set_name(vpc_name):
+    """
+    Gets the name of the ipset holding a VPC's public subnet CIDRs
+    """
+    return f"vpcctl-pub-{vpc_name}"
+
+# The security group chain, jumped to from INPUT inside a subnet's
+# namespace. Each namespace has its own tables, so a fixed name is unique
+# and always within iptables' chain-name length limit.
+SG_CHAIN_NAME = "SG"
+
+@lru_cache(maxsize=256)
+def get_sg_set_name(protocol, target):
+    """
+    Returns the port set holding a subnet's security group ports for one
+    protocol and target. Sets live inside the subnet's namespace.
+    """
+    return f"sg-{protocol}-{target.lower()}"
+
+def get_public_nat_rules(vpc_name, internet_iface):
+    """
+    Gets the (table, chain, rule) triples that NAT a VPC's public subnets
+    out of `internet_iface`. The rules match on the VPC's public ipset, so
+    one set of rules serves every public subnet in the VPC.
+    """
+    bridge_name = get_bridge_name(vpc_name)
+    chain_name = get_vpc_chain_name(vpc_name)
+    set_name = get_public_set_name(vpc_name)
+    return [
+        ("filter", chain_name, f"-i {bridge_name} -o {internet_iface} -m set --match-set {set_name} src -j ACCEPT"),
+        ("nat", "POSTROUTING", f"-m set --match-set {set_name} src -o {internet_iface} -j MASQUERADE"),
+    ]
+
+IPV4_INT = struct.Struct("!I")
+IPV4_PREFIXES = frozenset(str(prefix) for prefix in range(33))
+
+def _parse_ipv4_cidr(cidr):
+    """
+    Fast path for plain dotted-quad CIDRs: returns (network as int, prefix),
+    or None if anything is unusual, so ipaddress can parse it and report errors.
+    """
+    address, _, prefix = cidr.partition("/")
+    if prefix not in IPV4_PREFIXES:
+        return None
+    try:
+        # Unlike inet_aton, inet_pton only takes the strict a.b.c.d form
+        value = IPV4_INT.unpack(socket.inet_pton(socket.AF_INET, address))[0]
+    except OSError:
+        return None
+    prefix = int(prefix)
+    if value & ((1 << (32 - prefix)) - 1):
+        return None
+    return value, prefix
+
+def _ipv4_str(value):
+    return socket.inet_ntoa(IPV4_INT.pack(value))
+
+@lru_cache(maxsize=1024)
 def get_gateway_ip(cidr):
     try:
-        network = ipaddress.ip_network(cidr)
-        gateway_ip = str(network[1])
-        interface_ip = str(network[2])
-        gateway_ip_with_prefix = f"{gateway_ip}/{network.prefixlen}"
-        interface_ip_with_prefix = f"{interface_ip}/{network.prefixlen}"
+        parsed = _parse_ipv4_cidr(cidr)
+        if parsed:
+            base, prefix = parsed
+            if prefix > 30:
+                raise ValueError("network is too small for a gateway and an interface address")
+            gateway_ip = _ipv4_str(base + 1)
+            interface_ip = _ipv4_str(base + 2)
+        else:
+            # Uncommon spellings only; most runs never import ipaddress
+            import ipaddress
+            network = ipaddress.ip_network(cidr)
+            if network.num_addresses < 3:
+                raise ValueError("network is too small for a gateway and an interface address")
+            base = network.network_address
+            prefix = network.prefixlen
+            gateway_ip = str(base + 1)
+            interface_ip = str(base + 2)
+        gateway_ip_with_prefix = f"{gateway_ip}/{prefix}"
+        interface_ip_with_prefix = f"{interface_ip}/{prefix}"
         return (gateway_ip, interface_ip, gateway_ip_with_prefix, interface_ip_with_prefix)
-    except Exception as e:
+    except (ValueError, TypeError) as e:
         log.error(f"Invalid CIDR '{cidr}': {e}")
         sys.exit(1)
 
 def find_subnets_for_vpc(vpc_name):
-    subnets = []
-    stdout, _ = run_cmd(["ip", "netns", "list"])
-    if stdout:
-        ns_prefix = f"ns-{vpc_name}-"
-        for line in stdout.splitlines():
-            ns_name = line.split()[0]
-            if ns_name.startswith(ns_prefix):
-                subnet_name = ns_name[len(ns_prefix):]
-                subnets.append({"name": subnet_name, "ns_name": ns_name})
-    return subnets
+    # A pure scan of the cached /var/run/netns listing: no fork, no parsing
+    ns_prefix = f"ns-{vpc_name}-"
+    return [{"name": ns_name[len(ns_prefix):], "ns_name": ns_name}
+            for ns_name in sorted(_list_netns()) if ns_name.startswith(ns_prefix)]
 
 
 # Core VPC Function
@@ -115,34 +550,44 @@ def create_vpc(vpc_name, cidr_block):
     log.info(f"--- Creating VPC '{vpc_name}' ({cidr_block}) ---")
     bridge_name = get_bridge_name(vpc_name)
 
-    stdout, stderr = run_cmd(["ip", "-br", "link", "show", "dev", bridge_name], check=False, capture=True)
-    if bridge_name in stdout:
+    if bridge_exists(bridge_name):
         log.warning(f"VPC '{vpc_name}' (bridge '{bridge_name}') already exists. Skipping creation.")
         return
 
     try:
-        run_cmd(["ip", "link", "add", "name", bridge_name, "type", "bridge"])
-        run_cmd(["ip", "link", "set", "dev", bridge_name, "up"])
+        # Created already up: one RTM_NEWLINK request instead of two
+        run_cmd(["ip", "link", "add", "name", bridge_name, "up", "type", "bridge"])
         
         log.info("   Enabling br_netfilter for firewalling...")
-        run_cmd(["modprobe", "br_netfilter"], check=False)
-        run_cmd(["sysctl", "-w", "net.bridge.bridge-nf-call-iptables=1"])
-        run_cmd(["sysctl", "-w", "net.bridge.bridge-nf-call-ip6tables=1"])
+        load_kernel_module("br_netfilter")
+        sysctl_set("net.bridge.bridge-nf-call-iptables", "1")
+        sysctl_set("net.bridge.bridge-nf-call-ip6tables", "1")
 
-        run_cmd(["sysctl", "-w", f"net.ipv4.conf.{bridge_name}.forwarding=1"])
-        run_cmd(["sysctl", "-w", "net.ipv4.ip_forward=1"])
+        sysctl_set(f"net/ipv4/conf/{bridge_name}/forwarding", "1")
+        sysctl_set("net.ipv4.ip_forward", "1")
         
-        run_cmd(["iptables", "-A", "FORWARD", "-i", bridge_name, "-o", bridge_name, "-j", "ACCEPT"])
-        
-        run_cmd(["iptables", "-A", "FORWARD", "-i", bridge_name, "-j", "DROP"])
-        run_cmd(["iptables", "-A", "FORWARD", "-o", bridge_name, "-j", "DROP"])
+        # FORWARD only holds two jumps per VPC; the VPC's own rules live in
+        # its chain, so packets never walk the rules of unrelated VPCs.
+        # Packets of already-accepted flows leave the chain at its first rule.
+        chain_name = get_vpc_chain_name(vpc_name)
+        apply_iptables_batch({
+            "filter": [
+                f":{chain_name} - [0:0]",
+                f"-A FORWARD -i {bridge_name} -j {chain_name}",
+                f"-A FORWARD -o {bridge_name} -j {chain_name}",
+                f"-A {chain_name} -m state --state RELATED,ESTABLISHED -j ACCEPT",
+                f"-A {chain_name} -i {bridge_name} -o {bridge_name} -j ACCEPT",
+                f"-A {chain_name} -j DROP",
+            ],
+        })
 
         log.info(f"Successfully created VPC '{vpc_name}'.")
     except Exception as e:
         log.error(f"An error occurred during VPC creation: {e}")
         log.error("Attempting to clean up...")
-        run_cmd(["ip", "link", "set", "dev", bridge_name, "down"], check=False)
-        run_cmd(["ip", "link","delete","dev", bridge_name, "type", "bridge"], check=False)
+        with IpBatch(check=False) as batch:
+            batch.add("link", "set", "dev", bridge_name, "down")
+            batch.add("link", "delete", "dev", bridge_name, "type", "bridge")
         log.error("Cleanup attempted. Please check system state.")
         sys.exit(1)
 
@@ -159,48 +604,265 @@ def create_subnet(vpc_name, subnet_name, cidr, subnet_type, internet_iface=None)
      interface_ip_with_prefix) = get_gateway_ip(cidr)
     log.info(f"   Gateway IP: {gateway_ip}")
     log.info(f"   Interface IP: {interface_ip}")
-    stdout, _ = run_cmd(["ip", "netns", "list"], check=False, capture=True)
-    if namespace_name in stdout:
+    if netns_exists(namespace_name):
         log.warning(f"Subnet '{subnet_name}' (namespace '{namespace_name}') already exists. Skipping creation.")
         return
+    if link_exists(veth_br):
+        # Veth names only carry a short hash, so the link may well belong to
+        # another subnet; it is never removed here
+        log.error(f"Interface '{veth_br}' already exists (possibly another subnet's veth). Not creating '{subnet_name}'.")
+        sys.exit(1)
+    if subnet_type == "public":
+        # Dry-run the host NAT rules first, so a missing VPC chain fails here
+        # instead of half-way through the creation. iptables does not check
+        # that the -o interface exists, so a mistyped one is not caught.
+        nat_present = check_public_nat(vpc_name, internet_iface)
+    added_gateway = False
     try:
-        run_cmd(["ip", "netns", "add", namespace_name])
-        run_cmd(["ip", "link", "add", veth_ns, "type", "veth", "peer", "name", veth_br])
-        run_cmd(["ip", "link", "set", veth_ns, "netns", namespace_name])
-        run_cmd(["ip", "link", "set", veth_br, "master", bridge_name])
-        run_cmd(["ip", "link", "set", veth_br, "up"])
-        stdout, _ = run_cmd(["ip", "addr", "show", "dev", bridge_name])
-        if gateway_ip not in stdout:
-            log.info(f"   Adding Gateway IP {gateway_ip_with_prefix} to bridge {bridge_name}")
-            run_cmd(["ip", "addr", "add", gateway_ip_with_prefix, "dev", bridge_name])
-        else:
-            log.info(f"   Gateway IP {gateway_ip} already present on {bridge_name}.")
-        run_cmd(["ip", "netns", "exec", namespace_name, "ip", "link", "set", "dev", "lo", "up"])
-        run_cmd(["ip", "netns", "exec", namespace_name, "ip", "addr", "add", interface_ip_with_prefix, "dev", veth_ns])
-        run_cmd(["ip", "netns", "exec", namespace_name, "ip", "link", "set", "dev", veth_ns, "up"])
-        run_cmd(["ip", "netns", "exec", namespace_name, "ip", "route", "add", "default", "via", gateway_ip])
-        
-        log.info("   Applying default stateful firewall rules to namespace...")
-        run_cmd(["ip", "netns", "exec", namespace_name, "iptables", "-P", "INPUT", "DROP"])
-        run_cmd(["ip", "netns", "exec", namespace_name, "iptables", "-A", "INPUT", "-i", "lo", "-j", "ACCEPT"])
-        run_cmd(["ip", "netns", "exec", namespace_name, "iptables", "-A", "INPUT", "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"])
+        # Everything on the host side goes through one ip process. The
+        # namespace and veth pair have to exist before anything can be
+        # attached or configured. The veth pair is created already attached
+        # to the bridge, up, and with its peer inside the namespace: one
+        # RTM_NEWLINK request instead of four.
+        with IpBatch() as batch:
+            if not take_pooled_netns(namespace_name):
+                batch.add("netns", "add", namespace_name)
+            batch.add("link", "add", veth_br, "master", bridge_name, "up",
+                      "type", "veth", "peer", "name", veth_ns, "netns", namespace_name)
+            if not iface_has_addr(bridge_name, gateway_ip):
+                log.info(f"   Adding Gateway IP {gateway_ip_with_prefix} to bridge {bridge_name}")
+                batch.add("addr", "add", gateway_ip_with_prefix, "dev", bridge_name)
+                added_gateway = True
+            else:
+                log.info(f"   Gateway IP {gateway_ip} already present on {bridge_name}.")
+        invalidate_netns_cache()
 
-        if subnet_type == "public":
-            log.info(f"   Configuring as 'public' subnet using interface '{internet_iface}'")
-            run_cmd(["iptables", "-t", "nat", "-I", "POSTROUTING", "-s", cidr, "-o", internet_iface, "-j", "MASQUERADE"])
-            run_cmd(["iptables", "-I", "FORWARD", "1", "-i", bridge_name, "-o", internet_iface, "-s", cidr, "-j", "ACCEPT"])
-            run_cmd(["iptables", "-I", "FORWARD", "1", "-i", internet_iface, "-o", bridge_name, "-d", cidr, "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"])
+        def configure_namespace():
+            with IpBatch(netns=namespace_name) as batch:
+                batch.add("link", "set", "dev", "lo", "up")
+                batch.add("addr", "add", interface_ip_with_prefix, "dev", veth_ns)
+                batch.add("link", "set", "dev", veth_ns, "up")
+                batch.add("route", "add", "default", "via", gateway_ip)
+
+        def apply_subnet_firewall():
+            # All iptables calls stay on this one worker: they contend for
+            # the xtables lock, so running them in parallel gains nothing.
+            log.info("   Applying default stateful firewall rules to namespace...")
+            # INPUT ordering invariant: 1 = RELATED,ESTABLISHED (most packets
+            # stop here), 2 = loopback, 3 = jump to the subnet's security
+            # group chain, which apply_rules flushes and reloads.
+            apply_iptables_batch({
+                "filter": [
+                    ":INPUT DROP [0:0]",
+                    f":{SG_CHAIN_NAME} - [0:0]",
+                    "-A INPUT -m state --state RELATED,ESTABLISHED -j ACCEPT",
+                    "-A INPUT -i lo -j ACCEPT",
+                    f"-A INPUT -j {SG_CHAIN_NAME}",
+                ],
+            }, netns=namespace_name)
+
+            if subnet_type == "public":
+                log.info(f"   Configuring as 'public' subnet using interface '{internet_iface}'")
+                add_public_cidr(vpc_name, cidr, internet_iface, install_nat=not nat_present)
+
+        # The namespace side and netfilter touch disjoint state,
+        # so they can be configured concurrently.
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [
+                executor.submit(configure_namespace),
+                executor.submit(apply_subnet_firewall),
+            ]
+            for future in futures:
+                future.result()
         log.info(f" Successfully created Subnet '{subnet_name}'.")
-    except Exception as e:
-        log.error(f"An error occurred during subnet creation: {e}")
+    except BaseException as e:
+        # run_cmd reports failures with sys.exit, so SystemExit is the usual
+        # case here; it has already logged the details.
+        if not isinstance(e, SystemExit):
+            log.error(f"An error occurred during subnet creation: {e}")
         log.error("Attempting to clean up...")
-        run_cmd(["ip", "netns", "delete", namespace_name], check=False)
-        run_cmd(["ip", "link", "delete", "dev", veth_br], check=False)
+        # Deleting the namespace also removes the veth pair if it was
+        # created; a veth_br that existed before is never touched.
+        with IpBatch(check=False) as batch:
+            batch.add("netns", "delete", namespace_name)
+            if added_gateway:
+                batch.add("addr", "del", gateway_ip_with_prefix, "dev", bridge_name)
+        invalidate_netns_cache()
+        if subnet_type == "public":
+            set_name = get_public_set_name(vpc_name)
+            run_cmd(["ipset", "-exist", "del", set_name, cidr], check=False)
+            if ipset_is_empty(set_name):
+                remove_public_nat(vpc_name)
         log.error("Cleanup attempted. Please check system state.")
+        if isinstance(e, (Exception, SystemExit)):
+            sys.exit(1)
+        # Daemon shutdown or Ctrl-C: keep propagating
+        raise
+
+
+# Public Subnet (NAT) Functions
+def add_public_cidr(vpc_name, cidr, internet_iface, install_nat):
+    """
+    Adds a CIDR to the VPC's public ipset, installing the shared NAT and
+    FORWARD rules too if `install_nat` (check_public_nat found none).
+    """
+    set_name = get_public_set_name(vpc_name)
+    load_kernel_module("iptable_nat")
+    apply_ipset_batch([f"create {set_name} hash:net", f"add {set_name} {cidr}"])
+    if not install_nat:
+        log.info(f"   NAT rules for '{vpc_name}' via '{internet_iface}' already present.")
+        return
+    apply_iptables_batch(get_public_nat_insertions(vpc_name, internet_iface))
+
+def get_public_nat_ifaces(vpc_name):
+    """
+    Returns the interfaces the VPC's public subnets are NATed out of, read
+    from the MASQUERADE rules that match its public ipset.
+    """
+    set_name = get_public_set_name(vpc_name)
+    stdout, _ = run_cmd(["iptables", "-t", "nat", "-S", "POSTROUTING"], check=False, capture=True)
+    ifaces = set()
+    for line in stdout.splitlines():
+        fields = line.split()
+        if f"--match-set {set_name} " in line and "-o" in fields:
+            ifaces.add(fields[fields.index("-o") + 1])
+    return ifaces
+
+def get_public_nat_insertions(vpc_name, internet_iface):
+    """
+    Returns the iptables-restore lines ({table: [...]}) that install the
+    VPC's shared NAT and FORWARD rules.
+    """
+    batch = {}
+    for table, chain, rule in get_public_nat_rules(vpc_name, internet_iface):
+        # Inserted right after the chain's RELATED,ESTABLISHED rule, so
+        # they come before the VPC's catch-all DROP
+        position = "2" if table == "filter" else "1"
+        batch.setdefault(table, []).append(f"-I {chain} {position} {rule}")
+    return batch
+
+def check_public_nat(vpc_name, internet_iface):
+    """
+    Checks that a new public subnet can use `internet_iface` and returns
+    True if the VPC's NAT and FORWARD rules for it are already installed.
+    Otherwise the rules are validated with `iptables-restore --test`
+    without committing anything. They only parse once their ipset exists,
+    so the (empty) set is created first and destroyed again if the test
+    fails.
+    """
+    ifaces = get_public_nat_ifaces(vpc_name)
+    # The public ipset is per VPC, so rules for a second interface would
+    # NAT every public subnet out of both
+    other_ifaces = ifaces - {internet_iface}
+    if other_ifaces:
+        log.error(f"VPC '{vpc_name}' already NATs its public subnets out of '{', '.join(sorted(other_ifaces))}'. "
+                  "All public subnets in a VPC must use the same --internet-iface.")
         sys.exit(1)
+    if internet_iface in ifaces:
+        return True
+    load_kernel_module("iptable_nat")
+    set_name = get_public_set_name(vpc_name)
+    apply_ipset_batch([f"create {set_name} hash:net"])
+    try:
+        apply_iptables_batch(get_public_nat_insertions(vpc_name, internet_iface), test=True)
+    except SystemExit:
+        if ipset_is_empty(set_name):
+            run_cmd(["ipset", "destroy", set_name], check=False)
+        raise
+    return False
+
+def public_nat_deletions(vpc_name, tables=("nat", "filter")):
+    """
+    Returns the iptables-restore lines ({table: [...]}) that delete every
+    rule referencing the VPC's public ipset.
+    """
+    set_name = get_public_set_name(vpc_name)
+    chains = {"nat": "POSTROUTING", "filter": get_vpc_chain_name(vpc_name)}
+    deletions = {}
+    for table in tables:
+        chain = chains[table]
+        stdout, _ = run_cmd(["iptables", "-t", table, "-S", chain], check=False, capture=True)
+        for line in stdout.splitlines():
+            if line.startswith(f"-A {chain} ") and f"--match-set {set_name} " in line:
+                deletions.setdefault(table, []).append("-D" + line[2:])
+    return deletions
+
+def remove_public_nat(vpc_name):
+    """
+    Removes every rule that references the VPC's public ipset in one
+    iptables-restore commit, then the set.
+    """
+    deletions = public_nat_deletions(vpc_name)
+    if deletions:
+        apply_iptables_batch(deletions)
+    run_cmd(["ipset", "destroy", get_public_set_name(vpc_name)], check=False)
+
+def ipset_is_empty(set_name):
+    stdout, _ = run_cmd(["ipset", "-t", "list", set_name], check=False, capture=True)
+    for line in stdout.splitlines():
+        if line.startswith("Number of entries:"):
+            return line.partition(":")[2].strip() == "0"
+    return False
 
 
 # Firewall / Security Group Function
+# Policy action -> iptables target
+POLICY_ACTIONS = {"ACCEPT": "ACCEPT", "DENY": "DROP"}
+# Protocols with ports the bitmap:port security group sets can match
+# (the set match only reads TCP and UDP ports)
+POLICY_PROTOCOLS = ("tcp", "udp")
+PORT_DIGITS = frozenset("0123456789")
+
+def _is_port_number(text):
+    return 0 < len(text) <= 5 and PORT_DIGITS.issuperset(text)
+
+def normalize_port(port):
+    """
+    Returns a port or port range ('80', '1000:2000', '1000-2000') in the
+    'a-b' form ipset uses, or None if it is not a valid port spec.
+    """
+    if isinstance(port, bool):
+        return None
+    low, sep, high = str(port).replace(":", "-", 1).partition("-")
+    if not _is_port_number(low) or (sep and not _is_port_number(high)):
+        return None
+    low = int(low)
+    high = int(high) if sep else low
+    if low > high or high > 65535:
+        return None
+    return f"{low}-{high}" if sep else str(low)
+
+def validate_policy(policy):
+    """
+    Checks a security group policy in one pass and returns a list of
+    problems (empty if the policy is valid).
+    """
+    if not isinstance(policy, dict):
+        return ["Policy must be a JSON object with 'vpc', 'subnet', and 'ingress' keys."]
+    errors = []
+    for key in ("vpc", "subnet"):
+        if not isinstance(policy.get(key), str) or not policy.get(key):
+            errors.append(f"Missing or invalid required key: '{key}'")
+    ingress_rules = policy.get('ingress', [])
+    if not isinstance(ingress_rules, list):
+        return errors + ["'ingress' must be a list of rules."]
+    for i, rule in enumerate(ingress_rules):
+        if not isinstance(rule, dict):
+            errors.append(f"Rule {i}: must be an object. Rule: {rule}")
+            continue
+        missing = [key for key in ("port", "protocol", "action") if key not in rule]
+        if missing:
+            errors.append(f"Rule {i}: missing key(s) {', '.join(missing)}. Rule: {rule}")
+            continue
+        if normalize_port(rule['port']) is None:
+            errors.append(f"Rule {i}: invalid port '{rule['port']}'. Rule: {rule}")
+        if not isinstance(rule['protocol'], str) or rule['protocol'].lower() not in POLICY_PROTOCOLS:
+            errors.append(f"Rule {i}: invalid protocol '{rule['protocol']}'. Must be one of {', '.join(POLICY_PROTOCOLS)}.")
+        if not isinstance(rule['action'], str) or rule['action'].upper() not in POLICY_ACTIONS:
+            errors.append(f"Rule {i}: invalid action '{rule['action']}'. Must be 'ACCEPT' or 'DENY'.")
+    return errors
+
 def apply_rules(policy_file):
     """
     Applies firewall rules to a subnet from a JSON file.
@@ -220,46 +882,56 @@ def apply_rules(policy_file):
         log.error(f"Failed to read policy file: {e}")
         sys.exit(1)
 
-    try:
-        vpc_name = policy['vpc']
-        subnet_name = policy['subnet']
-        ingress_rules = policy.get('ingress', [])
-    except KeyError as e:
-        log.error(f"Invalid policy file: Missing required key: {e}")
-        log.error("Policy must contain 'vpc', 'subnet', and 'ingress' keys.")
+    # Every rule is checked before anything is changed, so a bad policy
+    # is rejected as a whole instead of being partially applied.
+    errors = validate_policy(policy)
+    if errors:
+        log.error(f"Invalid policy file: {policy_file}")
+        for error in errors:
+            log.error(f"   {error}")
         sys.exit(1)
 
+    vpc_name = policy['vpc']
+    subnet_name = policy['subnet']
     namespace_name = get_namespace_name(vpc_name, subnet_name)
     log.info(f"   Targeting namespace: {namespace_name}")
 
-    for rule in ingress_rules:
-        try:
-            port = rule['port']
-            protocol = rule['protocol'].lower()
-            action_json = rule['action'].upper()
-            
-            if action_json == "ACCEPT":
-                iptables_target = "ACCEPT"
-            elif action_json == "DENY":
-                iptables_target = "DROP"
-            else:
-                log.warning(f"   Invalid action '{action_json}'. Must be 'ACCEPT' or 'DENY'. Skipping.")
-                continue
+    # (protocol, target, port) with ports in ipset's 'a-b' range form
+    set_entries = [
+        (rule['protocol'].lower(), POLICY_ACTIONS[rule['action'].upper()], normalize_port(rule['port']))
+        for rule in policy.get('ingress', [])
+    ]
+    if log.isEnabledFor(logging.INFO):
+        for protocol, target, port in set_entries:
+            log.info("   Adding rule: %s %s port %s", target, protocol, port)
 
-            log.info(f"   Applying rule: {action_json} (as {iptables_target}) {protocol} port {port}")
-            
-            run_cmd([
-                "ip", "netns", "exec", namespace_name,
-                "iptables", "-I", "INPUT", "3",
-                "-p", protocol,
-                "--dport", str(port),
-                "-j", iptables_target
-            ])
-        
-        except KeyError as e:
-            log.warning(f"   Skipping invalid rule, missing key: {e}. Rule: {rule}")
-        except Exception as e:
-            log.error(f"   Failed to apply rule: {rule}. Error: {e}")
+    # The policy file replaces the subnet's whole security group. Ports are
+    # kept in one set per (protocol, target), each matched by a single rule
+    # in the subnet's SG chain. If a port appears more than once, the last
+    # rule for it wins, so the accept and drop sets never overlap.
+    ports = {}
+    for protocol, target, port in set_entries:
+        ports.setdefault(protocol, {})[port] = target
+    set_lines = []
+    chain_name = SG_CHAIN_NAME
+    chain_rules = [f":{chain_name} - [0:0]"]
+    for protocol, port_targets in ports.items():
+        for target in ("ACCEPT", "DROP"):
+            set_name = get_sg_set_name(protocol, target)
+            # Filled under a temporary name and swapped in, so the live set
+            # is never seen half-loaded
+            staging = f"{set_name}-new"
+            set_lines.append(f"create {set_name} bitmap:port range 0-65535")
+            set_lines.append(f"create {staging} bitmap:port range 0-65535")
+            set_lines.append(f"flush {staging}")
+            set_lines += [f"add {staging} {port}" for port, t in port_targets.items() if t == target]
+            set_lines.append(f"swap {staging} {set_name}")
+            set_lines.append(f"destroy {staging}")
+            chain_rules.append(f"-A {chain_name} -p {protocol} -m set --match-set {set_name} dst -j {target}")
+    apply_ipset_batch(set_lines, netns=namespace_name)
+
+    # ':<chain> -' flushes the SG chain in the same commit that reloads it
+    apply_iptables_batch({"filter": chain_rules}, netns=namespace_name)
 
     log.info(f" Successfully applied rules to '{subnet_name}'.")
 
@@ -271,18 +943,41 @@ def delete_subnet(vpc_name, subnet_name, subnet_cidr, internet_iface=None):
     namespace_name = get_namespace_name(vpc_name, subnet_name)
     if not subnet_cidr:
         log.error(f"   Cannot delete subnet {subnet_name}: Unknown CIDR. Deleting namespace only.")
-        run_cmd(["ip", "netns", "delete", namespace_name], check=False)
+        delete_netns(namespace_name)
         return
     (gateway_ip, _, gateway_ip_with_prefix, _) = get_gateway_ip(subnet_cidr)
-    if internet_iface:
+
+    def delete_public_rules():
         log.info(f"   Deleting public subnet rules...")
-        run_cmd(["iptables", "-t", "nat", "-D", "POSTROUTING", "-s", subnet_cidr, "-o", internet_iface, "-j", "MASQUERADE"], check=False)
-        run_cmd(["iptables", "-D", "FORWARD", "-i", bridge_name, "-o", internet_iface, "-s", subnet_cidr, "-j", "ACCEPT"], check=False)
-        run_cmd(["iptables", "-D", "FORWARD", "-i", internet_iface, "-o", bridge_name, "-d", subnet_cidr, "-m", "state", "--state", "RELATED,ESTABLISHED", "-j", "ACCEPT"], check=False)
-    run_cmd(["ip", "addr", "del", gateway_ip_with_prefix, "dev", bridge_name], check=False)
-    log.info(f"   Removed Gateway IP {gateway_ip_with_prefix} from {bridge_name}")
-    run_cmd(["ip", "netns", "delete", namespace_name], check=False)
-    log.info(f"   Deleted namespace {namespace_name}.")
+        set_name = get_public_set_name(vpc_name)
+        run_cmd(["ipset", "-exist", "del", set_name, subnet_cidr], check=False)
+        if ipset_is_empty(set_name):
+            log.info(f"   Last public subnet removed. Deleting NAT rules for '{vpc_name}'...")
+            remove_public_nat(vpc_name)
+
+    def delete_links():
+        # The bridge address and the namespace go in one best-effort ip batch
+        veth_ns, veth_br = get_veth_pair_names(vpc_name, subnet_name)
+        recycled = recycle_netns(namespace_name, veth_ns, veth_br)
+        with IpBatch(check=False) as batch:
+            batch.add("addr", "del", gateway_ip_with_prefix, "dev", bridge_name)
+            if not recycled:
+                batch.add("netns", "delete", namespace_name)
+        log.info(f"   Removed Gateway IP {gateway_ip_with_prefix} from {bridge_name}")
+        if not recycled:
+            invalidate_netns_cache()
+            log.info(f"   Deleted namespace {namespace_name}.")
+
+    # The NAT rules and the links are independent, so they are torn down
+    # concurrently.
+    tasks = [delete_links]
+    if internet_iface:
+        tasks.append(delete_public_rules)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        for future in futures:
+            future.result()
     log.info(f" Successfully deleted Subnet '{subnet_name}'.")
 
 def delete_vpc(vpc_name, internet_iface=None):
@@ -290,22 +985,49 @@ def delete_vpc(vpc_name, internet_iface=None):
     bridge_name = get_bridge_name(vpc_name)
     log.info("   Finding associated subnets (namespaces)...")
     subnets = find_subnets_for_vpc(vpc_name)
-    if not subnets:
-        log.info("   No subnets found to delete.")
-    for subnet in subnets:
-        subnet_name = subnet['name']
+
+    def delete_namespace(subnet):
         ns_name = subnet['ns_name']
         log.warning(f"   Deleting namespace {ns_name}. F firewall/IP rules may remain.")
+        delete_netns(ns_name)
+
+    if not subnets:
+        log.info("   No subnets found to delete.")
+    else:
+        # Namespace teardown is independent per subnet and the kernel batches
+        # concurrent netns cleanups, so the deletes are issued in parallel.
+        # The iptables cleanup below stays serial (xtables lock).
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=min(len(subnets), 8)) as executor:
+            list(executor.map(delete_namespace, subnets))
         log.warning("   (To fix this, `delete-subnet` should be called first with full details)")
-        run_cmd(["ip", "netns", "delete", ns_name], check=False)
-    log.info(f"   Deleting VPC isolation rules for {bridge_name}...")
-    run_cmd(["iptables", "-D", "FORWARD", "-i", bridge_name, "-o", bridge_name, "-j", "ACCEPT"], check=False)
-    run_cmd(["iptables", "-D", "FORWARD", "-i", bridge_name, "-j", "DROP"], check=False)
-    run_cmd(["iptables", "-D", "FORWARD", "-o", bridge_name, "-j", "DROP"], check=False)  
+    log.info(f"   Deleting VPC isolation and public subnet NAT rules for {bridge_name}...")
+    chain_name = get_vpc_chain_name(vpc_name)
+    # Only rules and chains that exist are deleted, so the single commit
+    # cannot fail on a half-deleted VPC. Flushing the VPC chain also drops
+    # its public FORWARD rule; the NAT rule lives in POSTROUTING.
+    stdout, _ = run_cmd(["iptables", "-S"], check=False, capture=True)
+    filter_rules = set(stdout.splitlines())
+    deletions = public_nat_deletions(vpc_name, tables=("nat",))
+    filter_deletions = [
+        f"-D FORWARD {direction} {bridge_name} -j {chain_name}"
+        for direction in ("-i", "-o")
+        if f"-A FORWARD {direction} {bridge_name} -j {chain_name}" in filter_rules
+    ]
+    if f"-N {chain_name}" in filter_rules:
+        filter_deletions += [f"-F {chain_name}", f"-X {chain_name}"]
+    if filter_deletions:
+        deletions["filter"] = filter_deletions
+    if deletions:
+        apply_iptables_batch(deletions)
+    run_cmd(["ipset", "destroy", get_public_set_name(vpc_name)], check=False)
     log.info(f"   Cleaning up any orphaned peering rules for {bridge_name}...")
     delete_all_peering_for_vpc(bridge_name)
-    run_cmd(["ip", "link", "set", "dev", bridge_name, "down"], check=False)
-    run_cmd(["ip", "link", "delete", "dev", bridge_name, "type", "bridge"], check=False)
+    with IpBatch(check=False) as batch:
+        batch.add("link", "set", "dev", bridge_name, "down")
+        batch.add("link", "delete", "dev", bridge_name, "type", "bridge")
+    # A re-created bridge starts with default settings again
+    _sysctl_applied.pop(f"net/ipv4/conf/{bridge_name}/forwarding", None)
     log.info(f" Successfully deleted VPC '{vpc_name}'.")
 
 # Peering Functions
@@ -318,21 +1040,21 @@ def peer_vpc(vpc_a_name, vpc_b_name):
     bridge_b = get_bridge_name(vpc_b_name)
 
     try:
-        rule_a_b = ["-i", bridge_a, "-o", bridge_b, "-j", "ACCEPT"]
-        stdout, stderr = run_cmd(["iptables", "-C", "FORWARD"] + rule_a_b, check=False)
-        if "Bad rule" in stderr or "does not exist" in stderr:
-            log.info(f"   Adding rule: {vpc_a_name} -> {vpc_b_name}")
-            run_cmd(["iptables", "-I", "FORWARD"] + rule_a_b)
-        else:
-            log.warning(f"   Rule: {vpc_a_name} -> {vpc_b_name} already exists.")
-        
-        rule_b_a = ["-i", bridge_b, "-o", bridge_a, "-j", "ACCEPT"]
-        stdout, stderr = run_cmd(["iptables", "-C", "FORWARD"] + rule_b_a, check=False)
-        if "Bad rule" in stderr or "does not exist" in stderr:
-            log.info(f"   Adding rule: {vpc_b_name} -> {vpc_a_name}")
-            run_cmd(["iptables", "-I", "FORWARD"] + rule_b_a)
-        else:
-            log.warning(f"   Rule: {vpc_b_name} -> {vpc_a_name} already exists.")
+        # One listing to check both directions, one commit to add the missing ones
+        stdout, _ = run_cmd(["iptables", "-S", "FORWARD"], capture=True)
+        existing = set(stdout.splitlines())
+        new_rules = []
+        for src_name, dst_name, rule in (
+            (vpc_a_name, vpc_b_name, f"-i {bridge_a} -o {bridge_b} -j ACCEPT"),
+            (vpc_b_name, vpc_a_name, f"-i {bridge_b} -o {bridge_a} -j ACCEPT"),
+        ):
+            if f"-A FORWARD {rule}" in existing:
+                log.warning(f"   Rule: {src_name} -> {dst_name} already exists.")
+            else:
+                log.info(f"   Adding rule: {src_name} -> {dst_name}")
+                new_rules.append(f"-I FORWARD {rule}")
+        if new_rules:
+            apply_iptables_batch({"filter": new_rules})
 
         log.info(f"Successfully peered '{vpc_a_name}' and '{vpc_b_name}'.")
 
@@ -348,24 +1070,22 @@ def delete_peering(vpc_a_name, vpc_b_name):
     bridge_a = get_bridge_name(vpc_a_name)
     bridge_b = get_bridge_name(vpc_b_name)
 
-    rule_a_b = ["-i", bridge_a, "-o", bridge_b, "-j", "ACCEPT"]
-    rule_b_a = ["-i", bridge_b, "-o", bridge_a, "-j", "ACCEPT"]
-    
     try:
-        log.info(f"   Deleting all instances of rule: {vpc_a_name} -> {vpc_b_name}")
-        while True:
-            _, stderr = run_cmd(["iptables", "-D", "FORWARD"] + rule_a_b, check=False)
-            
-            if "Bad rule" in stderr or "does not exist" in stderr:
-                break
-        
-        log.info(f"   Deleting all instances of rule: {vpc_b_name} -> {vpc_a_name}")
-        while True:
-            _, stderr = run_cmd(["iptables", "-D", "FORWARD"] + rule_b_a, check=False)
-            
-            if "Bad rule" in stderr or "does not exist" in stderr:
-                break
+        # Every instance of either rule is deleted in a single commit
+        stdout, _ = run_cmd(["iptables", "-S", "FORWARD"], capture=True)
+        rules = stdout.splitlines()
+        delete_rules = []
+        for src_name, dst_name, rule in (
+            (vpc_a_name, vpc_b_name, f"-i {bridge_a} -o {bridge_b} -j ACCEPT"),
+            (vpc_b_name, vpc_a_name, f"-i {bridge_b} -o {bridge_a} -j ACCEPT"),
+        ):
+            log.info(f"   Deleting all instances of rule: {src_name} -> {dst_name}")
+            delete_rules += [f"-D FORWARD {rule}"] * rules.count(f"-A FORWARD {rule}")
+        if delete_rules:
+            apply_iptables_batch({"filter": delete_rules})
         
+        # Each VPC chain accepts tracked flows at its first rule
+        log.info("   Connections opened while peered stay up until they close (see `conntrack -D`).")
         log.info(f"Successfully removed peering for '{vpc_a_name}' and '{vpc_b_name}'.")
 
     except Exception as e:
@@ -377,12 +1097,249 @@ def delete_all_peering_for_vpc(bridge_name):
     pass
 
 
+# Namespace Pool Functions
+# Pre-made, empty namespaces that create_subnet adopts instead of paying
+# for `ip netns add`, and that delete_subnet returns cleaned up. The pool
+# file holds the target pool size and doubles as the pool lock.
+NETNS_POOL_PREFIX = "vpcctl-pool-"
+NETNS_POOL_FILE = "/run/vpcctl-netns-pool"
+MS_BIND = 0x1000
+MNT_DETACH = 0x2
+
+@contextlib.contextmanager
+def netns_pool_lock():
+    import fcntl
+    with open(NETNS_POOL_FILE, "a+") as pool_file:
+        fcntl.flock(pool_file, fcntl.LOCK_EX)
+        pool_file.seek(0)
+        yield pool_file
+
+def _pool_target_size(pool_file):
+    try:
+        return int(pool_file.read().strip() or 0)
+    except ValueError:
+        return 0
+
+def _pooled_netns():
+    return sorted(ns for ns in _list_netns() if ns.startswith(NETNS_POOL_PREFIX))
+
+def _move_netns(src_name, dst_name):
+    """
+    Gives a named namespace a new name. The names are bind mounts, which
+    rename(2) refuses to move, so the namespace is bind-mounted under the
+    new name and the old mount is detached.
+    """
+    libc, get_errno = _libc()
+    src = os.path.join(NETNS_RUN_DIR, src_name)
+    dst = os.path.join(NETNS_RUN_DIR, dst_name)
+    os.close(os.open(dst, os.O_RDONLY | os.O_CREAT | os.O_EXCL, 0))
+    if libc.mount(src.encode(), dst.encode(), b"none", MS_BIND, None) != 0:
+        errno = get_errno()
+        os.unlink(dst)
+        raise OSError(errno, f"bind mount {src} -> {dst}: {os.strerror(errno)}")
+    if libc.umount2(src.encode(), MNT_DETACH) != 0:
+        # Roll back, so the namespace keeps only its old name
+        errno = get_errno()
+        libc.umount2(dst.encode(), MNT_DETACH)
+        os.unlink(dst)
+        raise OSError(errno, f"unmount {src}: {os.strerror(errno)}")
+    os.unlink(src)
+    invalidate_netns_cache()
+
+def _netns_in_use(ns_name):
+    """True if any process still runs inside the named namespace."""
+    try:
+        ns_inode = os.stat(os.path.join(NETNS_RUN_DIR, ns_name)).st_ino
+    except OSError:
+        return False
+    for pid in os.listdir("/proc"):
+        if pid.isdigit():
+            try:
+                if os.stat(f"/proc/{pid}/ns/net").st_ino == ns_inode:
+                    return True
+            except OSError:
+                continue
+    return False
+
+def create_netns_pool(size):
+    """Tops the namespace pool up (or trims it) to `size` empty namespaces."""
+    if size < 0:
+        log.error("Pool size must be 0 or more.")
+        sys.exit(1)
+    log.info(f"Preparing a pool of {size} network namespaces...")
+    with netns_pool_lock() as pool_file:
+        pooled = set(_pooled_netns())
+        with IpBatch() as batch:
+            for ns_name in sorted(pooled)[size:]:
+                batch.add("netns", "delete", ns_name)
+            index = 0
+            for _ in range(size - len(pooled)):
+                while f"{NETNS_POOL_PREFIX}{index}" in pooled:
+                    index += 1
+                batch.add("netns", "add", f"{NETNS_POOL_PREFIX}{index}")
+                index += 1
+        invalidate_netns_cache()
+        pool_file.truncate(0)
+        pool_file.write(f"{size}\n")
+    log.info(f"Namespace pool ready ({len(_pooled_netns())} available).")
+
+def take_pooled_netns(ns_name):
+    """Adopts a pooled namespace as `ns_name`. Returns False if the pool is empty."""
+    if not os.path.exists(NETNS_POOL_FILE):
+        return False
+    with netns_pool_lock():
+        invalidate_netns_cache()
+        pooled = _pooled_netns()
+        if not pooled:
+            return False
+        log.info(f"   Using pooled namespace {pooled[0]} as {ns_name}")
+        try:
+            _move_netns(pooled[0], ns_name)
+        except OSError as e:
+            log.warning(f"   Could not adopt {pooled[0]} ({e}). Creating a new namespace.")
+            return False
+        return True
+
+# Every iptables (and ip6tables) table with its built-in chains, as
+# restored into a recycled namespace. Without --noflush, iptables-restore
+# empties each table it is given and drops its user chains.
+NETNS_RESET_TABLES = (
+    ("raw", ("PREROUTING", "OUTPUT")),
+    ("mangle", ("PREROUTING", "INPUT", "FORWARD", "OUTPUT", "POSTROUTING")),
+    ("nat", ("PREROUTING", "INPUT", "OUTPUT", "POSTROUTING")),
+    ("filter", ("INPUT", "FORWARD", "OUTPUT")),
+)
+# `ip` batches (per address family) that bring a recycled namespace's
+# addresses, routes and policy rules back to those of a new namespace.
+# Once lo is down, it has no addresses and is the only link left, so the
+# flushes also catch routes not tied to a device (blackhole, unreachable).
+NETNS_RESET_IP_CMDS = (
+    ("-4", ("link set dev lo down", "addr flush dev lo", "route flush table all",
+            "rule flush", "rule add priority 32766 lookup main",
+            "rule add priority 32767 lookup default")),
+    ("-6", ("addr flush dev lo", "route flush table all",
+            "rule flush", "rule add priority 32766 lookup main")),
+)
+
+def _netns_links(ns_name):
+    stdout, _ = run_cmd(["ip", "-n", ns_name, "-o", "link", "show"], check=False, capture=True)
+    # e.g. "2: veth-vppua1b-ns@if3: <BROADCAST,..."
+    return {line.split(": ", 2)[1].split("@")[0] for line in stdout.splitlines() if ": " in line}
+
+def recycle_netns(ns_name, veth_ns, veth_br):
+    """
+    Empties a subnet namespace and returns it to the pool if the pool is
+    below its target size. Returns False if the caller should delete it,
+    which is also the answer for any namespace that cannot be fully reset.
+    """
+    if not os.path.exists(NETNS_POOL_FILE):
+        return False
+    with netns_pool_lock() as pool_file:
+        invalidate_netns_cache()
+        pooled = _pooled_netns()
+        if len(pooled) >= _pool_target_size(pool_file) or _netns_in_use(ns_name):
+            return False
+        extra_links = _netns_links(ns_name) - {"lo", veth_ns}
+        if extra_links:
+            log.info(f"   Not recycling {ns_name}: it has extra links ({', '.join(sorted(extra_links))}).")
+            return False
+        # Stale conntrack entries would let old flows past the next
+        # subnet's RELATED,ESTABLISHED rule
+        if resolve_binary("conntrack") is None:
+            log.info(f"   Not recycling {ns_name}: conntrack (conntrack-tools) is not installed.")
+            return False
+        log.info(f"   Returning namespace {ns_name} to the pool...")
+        reset = "".join(
+            f"*{table}\n" + "".join(f":{chain} ACCEPT [0:0]\n" for chain in chains) + "COMMIT\n"
+            for table, chains in NETNS_RESET_TABLES
+        )
+        # Deleting the host end removes the pair, with its address and routes
+        run_cmd(["ip", "link", "delete", "dev", veth_br], check=False)
+        try:
+            # A tool that is not installed cannot have left rules behind.
+            # nft goes first: on iptables-nft hosts it also drops the
+            # iptables tables, which the restores then re-create empty.
+            if resolve_binary("nft"):
+                run_cmd(["nft", "flush", "ruleset"], netns=ns_name)
+            run_cmd(["iptables-restore", "--wait", "5"], netns=ns_name, input_text=reset)
+            if resolve_binary("ip6tables-restore"):
+                run_cmd(["ip6tables-restore", "--wait", "5"], netns=ns_name, input_text=reset)
+            run_cmd(["ipset", "destroy"], netns=ns_name)
+            run_cmd(["conntrack", "-F"], netns=ns_name, quiet_success=True)
+            run_cmd(["conntrack", "-F", "-f", "ipv6"], netns=ns_name, quiet_success=True)
+            for family, cmds in NETNS_RESET_IP_CMDS:
+                run_cmd(["ip", "-n", ns_name, family, "-batch", "-"], input_text="\n".join(cmds) + "\n")
+        except SystemExit:
+            # run_cmd has logged why
+            log.warning(f"   Could not reset {ns_name}. Deleting it instead.")
+            return False
+        index = 0
+        while f"{NETNS_POOL_PREFIX}{index}" in pooled:
+            index += 1
+        try:
+            _move_netns(ns_name, f"{NETNS_POOL_PREFIX}{index}")
+        except OSError as e:
+            log.warning(f"   Could not return {ns_name} to the pool ({e}). Deleting it instead.")
+            return False
+        return True
+
+
 # Main CLI Parser
-def main():
+# Flags accepted by the argparse-free fast path: command -> (required, optional)
+FAST_PATH_COMMANDS = {
+    "create-vpc": ({"--name", "--cidr"}, set()),
+    "create-subnet": ({"--vpc", "--name", "--cidr", "--type"}, {"--internet-iface"}),
+    "delete-vpc": ({"--name"}, set()),
+    "delete-subnet": ({"--vpc", "--name", "--cidr"}, {"--internet-iface"}),
+    "peer-vpc": ({"--vpc-a", "--vpc-b"}, set()),
+    "delete-peering": ({"--vpc-a", "--vpc-b"}, set()),
+    "apply-rules": ({"--policy"}, set()),
+}
+
+def parse_fast_path(argv):
+    """
+    Parses the string-only commands (everything but `netns-pool` and
+    `daemon`) without importing argparse or building the parser tree.
+    Returns None for anything it does not fully understand (help,
+    unknown, repeated or missing flags, bad values) so argparse can
+    handle and report it.
+    """
+    quiet = False
+    if argv and argv[0] in ("-q", "--quiet"):
+        quiet = True
+        argv = argv[1:]
+    if not argv or argv[0] not in FAST_PATH_COMMANDS:
+        return None
+    command, flags = argv[0], argv[1:]
+    required, optional = FAST_PATH_COMMANDS[command]
+    if len(flags) % 2:
+        return None
+    values = {}
+    for flag, value in zip(flags[::2], flags[1::2]):
+        if flag not in required and flag not in optional:
+            return None
+        if flag in values or value.startswith("-"):
+            return None
+        values[flag] = value
+    if not required <= values.keys():
+        return None
+    if values.get("--type", "private") not in ("public", "private"):
+        return None
+
+    args = types.SimpleNamespace(command=command, quiet=quiet)
+    for flag in required | optional:
+        setattr(args, flag[2:].replace("-", "_"), values.get(flag))
+    return args
+
+def build_parser():
+    # Imported here so the fast path never pays for it
+    import argparse
+
     parser = argparse.ArgumentParser(
         description="vpcctl - The Linux VPC management tool",
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
+    parser.add_argument("-q", "--quiet", action="store_true", help="Only log warnings and errors (skips per-command logging)")
     subparsers = parser.add_subparsers(dest="command", required=True)
 
     # (create-vpc, create-subnet, delete-vpc, delete-subnet)
@@ -427,9 +1384,37 @@ def main():
         help="Path to the JSON policy file"
     )
 
-    # Parse args
-    args = parser.parse_args()
+    # netns-pool
+    parser_netns_pool = subparsers.add_parser(
+        "netns-pool", help="Pre-create empty namespaces for new subnets to reuse"
+    )
+    parser_netns_pool.add_argument(
+        "--size",
+        type=int,
+        required=True,
+        help="Number of namespaces to keep in the pool (0 disables recycling)"
+    )
+
+    # daemon
+    parser_daemon = subparsers.add_parser(
+        "daemon", help="Serve vpcctl commands on a unix socket (see VPCCTL_SOCKET)"
+    )
+    parser_daemon.add_argument(
+        "--socket",
+        type=str,
+        default=DEFAULT_SOCKET,
+        help=f"Path of the unix socket to listen on (default: {DEFAULT_SOCKET})"
+    )
+
+    return parser
 
+def parse_args(argv):
+    args = parse_fast_path(argv)
+    if args is None:
+        args = build_parser().parse_args(argv)
+    return args
+
+def dispatch(args):
     # Command Dispatcher
     if args.command == "create-vpc":
         create_vpc(args.name, args.cidr)
@@ -448,14 +1433,155 @@ def main():
     elif args.command == "apply-rules":
         apply_rules(args.policy)
 
+    elif args.command == "netns-pool":
+        create_netns_pool(args.size)
+
     else:
         log.error(f"Unknown command: {args.command}")
-        parser.print_help()
+        build_parser().print_help()
         sys.exit(1)
 
 
+# Daemon Mode
+# Requests and replies are newline-delimited JSON. A request is
+# {"argv": [...]}; the reply is any number of {"stream": ..., "data": ...}
+# output chunks followed by a final {"exit": <code>}.
+DEFAULT_SOCKET = "/run/vpcctl.sock"
+# Seconds a client may take to send its request line, and its maximum size
+REQUEST_TIMEOUT = 5
+REQUEST_MAX_BYTES = 65536
+
+class DaemonShutdown(BaseException):
+    """
+    Raised by the SIGTERM handler. Like KeyboardInterrupt it is not an
+    Exception, so it passes every `except Exception` and stops the daemon
+    even in the middle of a command.
+    """
+
+def _request_shutdown(signum, frame):
+    raise DaemonShutdown()
+
+class _ClientStream:
+    """File-like object that forwards writes to a daemon client."""
+    def __init__(self, sock_file, stream):
+        self.sock_file = sock_file
+        self.stream = stream
+
+    def write(self, data):
+        if data:
+            self.sock_file.write(json.dumps({"stream": self.stream, "data": data}).encode() + b"\n")
+        return len(data)
+
+    def flush(self):
+        self.sock_file.flush()
+
+def _exit_code(exc):
+    if exc.code is None:
+        return 0
+    return exc.code if isinstance(exc.code, int) else 1
+
+def _send_exit(sock_file, code):
+    try:
+        sock_file.write(json.dumps({"exit": code}).encode() + b"\n")
+        sock_file.flush()
+    except OSError:
+        pass
+
+def handle_client(conn):
+    """Runs one command for a connected client, streaming its output back."""
+    with conn, conn.makefile("rwb") as sock_file:
+        # An idle client must not hold up every other request
+        conn.settimeout(REQUEST_TIMEOUT)
+        try:
+            argv = json.loads(sock_file.readline(REQUEST_MAX_BYTES))["argv"]
+        except socket.timeout:
+            log.warning("Client sent no request in time. Dropping the connection.")
+            return
+        except (ValueError, KeyError, TypeError):
+            _send_exit(sock_file, 2)
+            return
+        conn.settimeout(None)
+        stdout = _ClientStream(sock_file, "stdout")
+        stderr = _ClientStream(sock_file, "stderr")
+        client_handler = logging.StreamHandler(stderr)
+        client_handler.setFormatter(log_handler.formatter)
+        root = logging.getLogger()
+        root.addHandler(client_handler)
+        # Kernel state and installed tools may have changed since the last
+        # request
+        invalidate_netns_cache()
+        _sysctl_applied.clear()
+        resolve_binary.cache_clear()
+        code = 0
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                args = parse_args(argv)
+                if args.command == "daemon":
+                    log.error("Cannot start a daemon from inside the daemon.")
+                    sys.exit(1)
+                root.setLevel(logging.WARNING if args.quiet else logging.INFO)
+                dispatch(args)
+        except SystemExit as e:
+            code = _exit_code(e)
+        except Exception as e:
+            log.error(f"Unexpected error while running {argv}: {e}")
+            code = 1
+        except (DaemonShutdown, KeyboardInterrupt):
+            # The command did not finish: never report it as a success
+            log.error("vpcctl daemon is shutting down. The command was interrupted.")
+            _send_exit(sock_file, 1)
+            raise
+        finally:
+            root.setLevel(logging.INFO)
+            root.removeHandler(client_handler)
+        _send_exit(sock_file, code)
+
+def serve(socket_path):
+    """
+    Serves commands on a unix socket so callers skip interpreter startup,
+    imports and parser construction. Requests are handled one at a time.
+    """
+    if os.path.exists(socket_path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                probe.connect(socket_path)
+            log.error(f"A vpcctl daemon is already listening on {socket_path}.")
+            sys.exit(1)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+
+    import signal
+    # Stopping the service (SIGTERM) still removes the socket file
+    signal.signal(signal.SIGTERM, _request_shutdown)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        server.listen()
+        log.info(f"vpcctl daemon listening on {socket_path}")
+        try:
+            while True:
+                conn, _ = server.accept()
+                try:
+                    handle_client(conn)
+                except OSError as e:
+                    log.warning(f"Lost connection to client: {e}")
+        except (DaemonShutdown, KeyboardInterrupt):
+            log.info("Shutting down vpcctl daemon.")
+        finally:
+            os.unlink(socket_path)
+
+def main():
+    # Parse args (VPCCTL_SOCKET clients have already exited at the top)
+    args = parse_args(sys.argv[1:])
+    if args.quiet:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.command == "daemon":
+        serve(args.socket)
+    else:
+        dispatch(args)
+
+
 if __name__ == "__main__":
-    if os.geteuid() != 0:
-        log.error("This script must be run as root (or with sudo).")
-        sys.exit(1)
     main()
\ No newline at end of file